@@ -1,29 +1,49 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
+import time
+import hashlib
 from datetime import datetime, timezone
 import bcrypt
 import jwt
+import orjson
 from enum import Enum
+from cachetools import TTLCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
+# The pool is per process: with N uvicorn/gunicorn workers (2 * cores + 1 is a
+# sane default) the server sees up to N * MONGO_POOL connections.
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_POOL', 50)),
+    minPoolSize=5,
+    compressors=os.environ.get('MONGO_COMPRESSORS', 'zstd,zlib'),
+    retryWrites=True,
+    serverSelectionTimeoutMS=3000,
+    socketTimeoutMS=5000,
+    tz_aware=True
+)
 db = client[os.environ['DB_NAME']]
 
-# Create the main app without a prefix
-app = FastAPI()
+# Create the main app without a prefix. uvicorn's default `--loop auto` and
+# `--http auto` pick up uvloop and httptools from requirements.txt.
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -31,6 +51,16 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer(auto_error=False)
 JWT_SECRET = "nike-store-secret-key-2025"
+BCRYPT_COST = int(os.environ.get('BCRYPT_COST', 12))
+_jwt = jwt.PyJWT()
+_JWT_OPTIONS = {"require": ["user_id", "exp"], "verify_signature": True, "verify_exp": True}
+
+# Validated token payloads and resolved users, keyed by a hash of the raw token
+_jwt_cache = TTLCache(maxsize=10000, ttl=30)
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+
+# Serialized product listings as (etag, body), keyed by the listing's query params
+_products_cache = TTLCache(maxsize=256, ttl=30)
 
 # Enums
 class ProductCategory(str, Enum):
@@ -46,7 +76,7 @@ class OrderStatus(str, Enum):
 
 # Pydantic Models
 class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     email: str
     full_name: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -61,7 +91,7 @@ class UserLogin(BaseModel):
     password: str
 
 class Product(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     name: str
     description: str
     price: float
@@ -91,14 +121,14 @@ class CartItem(BaseModel):
     color: str
 
 class Cart(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     user_id: str
     items: List[CartItem]
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Order(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     user_id: str
     items: List[CartItem]
     total_amount: float
@@ -113,28 +143,72 @@ class OrderCreate(BaseModel):
 
 # Helper functions
 def create_access_token(user_id: str):
-    payload = {"user_id": user_id, "exp": datetime.now(timezone.utc).timestamp() + 86400}
+    payload = {"user_id": user_id, "exp": int(time.time()) + 86400}
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
+async def hash_password(password: str) -> str:
+    # bcrypt is deliberately slow; keep it off the event loop. It releases the
+    # GIL while hashing, so the default thread pool already spreads it over cores.
+    loop = asyncio.get_running_loop()
+    password_hash = await loop.run_in_executor(
+        None, bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_COST)
+    )
+    return password_hash.decode('utf-8')
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8')
+    )
+
+def _token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
         return None
+    key = _token_key(credentials.credentials)
+    now = time.time()
+    cached = _user_cache.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=["HS256"])
-        user_id = payload.get("user_id")
-        if not user_id:
+        payload = _jwt_cache.get(key)
+        if payload is None or payload["exp"] <= now:
+            payload = _jwt.decode(credentials.credentials, JWT_SECRET, algorithms=["HS256"], options=_JWT_OPTIONS)
+            _jwt_cache[key] = payload
+        user_data = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0, "password_hash": 0})
+        if not user_data:
             return None
-        user_data = await db.users.find_one({"id": user_id})
-        return User(**user_data) if user_data else None
-    except:
+        user = User(**user_data)
+        # Never serve a cached user past the token's own expiry
+        _user_cache[key] = (user, min(payload["exp"], now + 30))
+        return user
+    except jwt.PyJWTError:
         return None
 
-def prepare_for_mongo(data):
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if isinstance(value, datetime):
-                data[key] = value.isoformat()
-    return data
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison per RFC 9110: proxies that compress may hand back W/"..."
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+async def stream_json_array(cursor):
+    # Emit documents as they arrive instead of buffering the whole result set
+    yield b"["
+    first = True
+    async for document in cursor:
+        yield orjson.dumps(document) if first else b"," + orjson.dumps(document)
+        first = False
+    yield b"]"
 
 # Auth Routes
 @api_router.post("/auth/register")
@@ -145,14 +219,18 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    password_hash = bcrypt.hashpw(user_data.password.encode('utf-8'), bcrypt.gensalt())
+    password_hash = await hash_password(user_data.password)
     
     # Create user
     user = User(email=user_data.email, full_name=user_data.full_name)
-    user_dict = prepare_for_mongo(user.dict())
-    user_dict["password_hash"] = password_hash.decode('utf-8')
+    user_dict = user.model_dump()
+    user_dict["password_hash"] = password_hash
     
-    await db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # A concurrent registration for the same email got there first
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create access token
     token = create_access_token(user.id)
@@ -167,7 +245,7 @@ async def login(login_data: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Check password
-    if not bcrypt.checkpw(login_data.password.encode('utf-8'), user_data["password_hash"].encode('utf-8')):
+    if not await verify_password(login_data.password, user_data["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     user = User(**user_data)
@@ -182,16 +260,41 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Product Routes
-@api_router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[ProductCategory] = None, featured: Optional[bool] = None):
-    filter_query = {}
-    if category:
-        filter_query["category"] = category
-    if featured is not None:
-        filter_query["featured"] = featured
+@api_router.get("/products")
+async def get_products(
+    request: Request,
+    category: Optional[ProductCategory] = None,
+    featured: Optional[bool] = None,
+    # No limit returns the full set; the frontend views don't paginate yet
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    skip: int = Query(0, ge=0)
+):
+    cache_key = (category, featured, limit, skip)
+    cached = _products_cache.get(cache_key)
+    if cached is None:
+        filter_query = {}
+        if category:
+            filter_query["category"] = category
+        if featured is not None:
+            filter_query["featured"] = featured
+        
+        # Documents were validated on write; serve them as stored
+        # The listing grid never shows descriptions; GET /products/{id} does
+        cursor = (
+            db.products.find(filter_query, {"_id": 0, "description": 0})
+            .sort("created_at", -1)
+            .skip(skip)
+            .limit(limit or 0)
+        )
+        body = orjson.dumps(await cursor.to_list(limit))
+        cached = (f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"', body)
+        _products_cache[cache_key] = cached
     
-    products = await db.products.find(filter_query).to_list(1000)
-    return [Product(**product) for product in products]
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=30"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
@@ -202,9 +305,10 @@ async def get_product(product_id: str):
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate):
-    product = Product(**product_data.dict())
-    product_dict = prepare_for_mongo(product.dict())
+    product = Product(**product_data.model_dump())
+    product_dict = product.model_dump()
     await db.products.insert_one(product_dict)
+    _products_cache.clear()
     return product
 
 # Cart Routes
@@ -213,73 +317,77 @@ async def get_cart(current_user: User = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    cart = await db.carts.find_one({"user_id": current_user.id})
-    if not cart:
-        # Create empty cart
-        new_cart = Cart(user_id=current_user.id, items=[])
-        cart_dict = prepare_for_mongo(new_cart.dict())
-        await db.carts.insert_one(cart_dict)
-        return new_cart
-    
+    # Create an empty cart on first use in the same round-trip; an upsert can't
+    # collide with a concurrent /cart/add creating it the way find + insert can
+    now = _utcnow()
+    cart = await db.carts.find_one_and_update(
+        {"user_id": current_user.id},
+        {"$setOnInsert": {"id": uuid.uuid4().hex, "items": [], "created_at": now, "updated_at": now}},
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
     return Cart(**cart)
 
+async def add_cart_item(user_id: str, cart_item: CartItem, now: datetime):
+    line_item = {"product_id": cart_item.product_id, "size": cart_item.size, "color": cart_item.color}
+    while True:
+        # Bump the quantity of a matching line item in place
+        cart = await db.carts.find_one_and_update(
+            {"user_id": user_id, "items": {"$elemMatch": line_item}},
+            {"$inc": {"items.$.quantity": cart_item.quantity}, "$set": {"updated_at": now}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if cart:
+            return cart
+        
+        # Otherwise append it, creating the cart on first use. The filter only
+        # matches while the item is still absent, so two concurrent adds can't
+        # both push it; the loser hits the unique user_id index on its upsert.
+        try:
+            return await db.carts.find_one_and_update(
+                {"user_id": user_id, "items": {"$not": {"$elemMatch": line_item}}},
+                {
+                    "$push": {"items": cart_item.model_dump()},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"id": uuid.uuid4().hex, "created_at": now}
+                },
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The item (or the cart) appeared meanwhile; go back to the $inc path
+            continue
+
+async def remove_cart_product(user_id: str, product_id: str, now: datetime):
+    # Drop every line item for the product server-side
+    return await db.carts.find_one_and_update(
+        {"user_id": user_id},
+        {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
 @api_router.post("/cart/add")
 async def add_to_cart(cart_item: CartItem, current_user: User = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    # Get or create cart
-    cart = await db.carts.find_one({"user_id": current_user.id})
-    if not cart:
-        cart = Cart(user_id=current_user.id, items=[])
-        cart_dict = prepare_for_mongo(cart.dict())
-        await db.carts.insert_one(cart_dict)
-    else:
-        cart = Cart(**cart)
-    
-    # Check if item already exists
-    existing_item = None
-    for item in cart.items:
-        if (item.product_id == cart_item.product_id and 
-            item.size == cart_item.size and 
-            item.color == cart_item.color):
-            existing_item = item
-            break
-    
-    if existing_item:
-        existing_item.quantity += cart_item.quantity
-    else:
-        cart.items.append(cart_item)
-    
-    cart.updated_at = datetime.now(timezone.utc)
-    
-    # Update in database
-    cart_dict = prepare_for_mongo(cart.dict())
-    await db.carts.update_one(
-        {"user_id": current_user.id}, 
-        {"$set": cart_dict}, 
-        upsert=True
-    )
-    
-    return {"message": "Item added to cart", "cart": cart}
+    cart = await add_cart_item(current_user.id, cart_item, _utcnow())
+    return {"message": "Item added to cart", "cart": Cart(**cart)}
 
 @api_router.delete("/cart/remove/{product_id}")
 async def remove_from_cart(product_id: str, current_user: User = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    cart = await db.carts.find_one({"user_id": current_user.id})
+    cart = await remove_cart_product(current_user.id, product_id, _utcnow())
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    cart = Cart(**cart)
-    cart.items = [item for item in cart.items if item.product_id != product_id]
-    cart.updated_at = datetime.now(timezone.utc)
-    
-    cart_dict = prepare_for_mongo(cart.dict())
-    await db.carts.update_one({"user_id": current_user.id}, {"$set": cart_dict})
-    
-    return {"message": "Item removed from cart", "cart": cart}
+    return {"message": "Item removed from cart", "cart": Cart(**cart)}
 
 # Order Routes
 @api_router.post("/orders", response_model=Order)
@@ -287,48 +395,67 @@ async def create_order(order_data: OrderCreate, current_user: User = Depends(get
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    # Calculate total
-    total_amount = 0.0
-    for item in order_data.items:
-        product = await db.products.find_one({"id": item.product_id})
-        if product:
-            total_amount += product["price"] * item.quantity
+    # Calculate total with a single round-trip for all line items
+    product_ids = [item.product_id for item in order_data.items]
+    cursor = db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "price": 1})
+    prices = {product["id"]: product["price"] async for product in cursor}
+    total_amount = sum(prices.get(item.product_id, 0.0) * item.quantity for item in order_data.items)
     
     # Create order
+    now = _utcnow()
     order = Order(
         user_id=current_user.id,
         items=order_data.items,
         total_amount=total_amount,
         status=OrderStatus.pending,
         shipping_address=order_data.shipping_address,
-        payment_intent_id=f"pi_{uuid.uuid4()}"  # Mock payment intent
+        payment_intent_id=f"pi_{uuid.uuid4().hex}",  # Mock payment intent
+        created_at=now
     )
     
-    order_dict = prepare_for_mongo(order.dict())
+    order_dict = order.model_dump()
     await db.orders.insert_one(order_dict)
     
     # Clear cart
     await db.carts.update_one(
         {"user_id": current_user.id}, 
-        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"items": [], "updated_at": now}}
     )
     
     return order
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(current_user: User = Depends(get_current_user)):
+@api_router.get("/orders")
+async def get_orders(
+    # No limit returns the full set; the frontend views don't paginate yet
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    orders = await db.orders.find({"user_id": current_user.id}).to_list(1000)
-    return [Order(**order) for order in orders]
+    cursor = (
+        db.orders.find({"user_id": current_user.id}, {"_id": 0})
+        .sort("created_at", -1)
+        .skip(skip)
+        .limit(limit or 0)
+    )
+    return StreamingResponse(stream_json_array(cursor), media_type="application/json")
 
 # Initialize sample data
+# Set once this process knows the catalog is populated, to skip the count query
+_seeded = False
+
 @api_router.post("/init-data")
 async def initialize_sample_data():
+    global _seeded
+    if _seeded:
+        return {"message": "Sample data already exists"}
+    
     # Check if products already exist
     existing_products = await db.products.count_documents({})
     if existing_products > 0:
+        _seeded = True
         return {"message": "Sample data already exists"}
     
     # Sample products
@@ -415,10 +542,10 @@ async def initialize_sample_data():
     ]
     
     # Create products
-    for product_data in sample_products:
-        product = Product(**product_data)
-        product_dict = prepare_for_mongo(product.dict())
-        await db.products.insert_one(product_dict)
+    product_docs = [Product(**product_data).model_dump() for product_data in sample_products]
+    await db.products.insert_many(product_docs, ordered=False)
+    _products_cache.clear()
+    _seeded = True
     
     return {"message": "Sample data initialized successfully"}
 
@@ -440,6 +567,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _create_unique_index(collection, key: str):
+    try:
+        await collection.create_index(key, unique=True)
+    except OperationFailure as e:
+        # Older data may hold duplicates (e.g. two carts for one user); keep
+        # serving and say what to clean up instead of failing startup
+        logger.error(
+            "Could not create unique index on %s.%s; remove the duplicate documents and restart: %s",
+            collection.name, key, e
+        )
+
+@app.on_event("startup")
+async def create_indexes():
+    await _create_unique_index(db.users, "id")
+    await _create_unique_index(db.users, "email")
+    await _create_unique_index(db.carts, "user_id")
+    await db.orders.create_index([("user_id", 1), ("created_at", -1)])
+    await _create_unique_index(db.products, "id")
+    await db.products.create_index([("category", 1), ("featured", 1), ("created_at", -1)])
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
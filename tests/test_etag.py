@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads these at import time; the Mongo client only connects on first use
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import _etag_matches  # noqa: E402
+
+ETAG = '"0123456789abcdef"'
+
+
+def test_exact_match():
+    assert _etag_matches(ETAG, ETAG)
+
+
+def test_weak_validator_matches():
+    assert _etag_matches(f"W/{ETAG}", ETAG)
+
+
+def test_match_inside_list():
+    assert _etag_matches(f'"stale", W/{ETAG}', ETAG)
+    assert _etag_matches(f' "stale" ,{ETAG} ', ETAG)
+
+
+def test_star_matches_anything():
+    assert _etag_matches("*", ETAG)
+
+
+def test_no_match():
+    assert not _etag_matches(None, ETAG)
+    assert not _etag_matches("", ETAG)
+    assert not _etag_matches('"stale"', ETAG)
+    assert not _etag_matches('"stale", W/"other"', ETAG)